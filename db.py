@@ -1,111 +1,666 @@
 import csv
+import io
+import mmap
 import os
-from collections import deque
-from threading import Lock
-from typing import Optional, List, Dict
+import weakref
+from collections import OrderedDict
+from itertools import accumulate
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Optional, List, Dict, Iterator, Tuple
 
-class Tabela:
-    def __init__(self, nome, campos, indice_campo=None, cache_limit=100):
+try:
+    import fcntl
+except ImportError:  # Fora do Unix não há trava entre processos: um único processo por arquivo
+    fcntl = None
+
+class RWLock:
+    """Trava de leitura/escrita: vários leitores ao mesmo tempo ou um único escritor.
+
+    `with lock:` trava para escrita e `with lock.leitura():` para leitura. Escritores
+    esperando têm prioridade sobre novos leitores, para não ficarem esperando para sempre.
+    """
+
+    def __init__(self):
+        self._condicao = Condition(Lock())
+        self._leitores = 0
+        self._escritores_esperando = 0
+        self._escrevendo = False
+
+    @contextmanager
+    def leitura(self):
+        with self._condicao:
+            while self._escrevendo or self._escritores_esperando:
+                self._condicao.wait()
+            self._leitores += 1
+        try:
+            yield self
+        finally:
+            with self._condicao:
+                self._leitores -= 1
+                if not self._leitores:
+                    self._condicao.notify_all()
+
+    def __enter__(self):
+        with self._condicao:
+            self._escritores_esperando += 1
+            while self._escrevendo or self._leitores:
+                self._condicao.wait()
+            self._escritores_esperando -= 1
+            self._escrevendo = True
+        return self
+
+    def __exit__(self, *exc):
+        with self._condicao:
+            self._escrevendo = False
+            self._condicao.notify_all()
+
+class TabelaCSV:
+    """Armazenamento de uma tabela em CSV, sem cache.
+
+    Com indice_campo o arquivo é só de acréscimo: atualizar grava uma nova versão da linha
+    (coluna _rev) e deletar grava uma marca de deleção (_deleted=1). O índice em memória
+    aponta para a versão viva de cada chave e compactar() reescreve o arquivo só com elas.
+    Se outra instância ou outro processo gravar no arquivo, o índice é relido na operação seguinte.
+    """
+
+    limite_compactacao = 1000  # Versões mortas toleradas no arquivo antes de compactar
+    linhas_por_flush = 100  # Linhas de uma mesma operação acumuladas no buffer antes de descarregar no disco
+    tamanho_bloco = 1 << 20  # Bytes do mmap separados em linhas de uma vez nas varreduras completas
+
+    def __init__(self, nome, campos, indice_campo=None):
         self.nome = nome
         self.campos = campos
         self.indice_campo = indice_campo
-        self.lock = Lock()
-        self.cache_limit = cache_limit  # Limite de cache em memória
-        self.cache = deque(maxlen=self.cache_limit)  # Cache para as linhas mais recentes
+        self.lock = RWLock()  # `with self._escrita()` para escrever, `with self.lock.leitura()` para ler
         self.arquivo_csv = f"{nome}.csv"
-        
-        # Carregar índice básico em disco se existir
-        if not os.path.exists(self.arquivo_csv):
-            with open(self.arquivo_csv, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.campos)
-                writer.writeheader()
-
-    def _salvar_dados(self, linha):
-        with open(self.arquivo_csv, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.campos)
-            writer.writerow(linha)
+        self._colunas = list(campos) + ["_rev", "_deleted"] if indice_campo else list(campos)
+        self._indice = {}  # Índice em memória {valor do indice_campo: offset da versão viva no CSV}
+        self._rev = 0  # Última revisão gravada
+        self._mortas = 0  # Versões antigas e marcas de deleção ainda presentes no arquivo
+        self._total = 0  # Linhas vivas de uma tabela sem índice (com índice é len(self._indice))
+        self._arquivo = None  # Handle de acréscimo mantido aberto entre as escritas
+        self._tamanho = 0  # Offset em que a próxima linha será gravada
+        self._assinatura = None  # (inode, tamanho, mtime) do arquivo como esta instância o deixou no disco
+        self._pendentes = 0  # Linhas no buffer ainda não descarregadas
+        self._linha_csv = io.StringIO()  # Onde o writer formata as linhas que precisam de aspas
+        self._writer = csv.writer(self._linha_csv)
+
+        # Trava entre processos, num arquivo à parte porque compactar troca o CSV por outro
+        self._trava = open(self.arquivo_csv + ".lock", 'ab')
+        weakref.finalize(self, self._trava.close)
+
+        with self._travar_arquivo():
+            if not os.path.exists(self.arquivo_csv):
+                self._reescrever([])
+
+            # Carregar índice do campo indexado a partir do CSV
+            if self.indice_campo:
+                if self._ler_cabecalho() != self._colunas:
+                    self._migrar()
+                self._reparar_final()
+                self._carregar_indice()
+            else:
+                self._total = sum(1 for _ in self._percorrer())
+            self._abrir_para_acrescimo()
+
+    def _abrir_para_acrescimo(self):
+        """(Re)abre o handle de acréscimo; o arquivo é descarregado e fechado ao coletar a tabela."""
+        if self._arquivo:
+            self._finalizador()
+        self._arquivo = open(self.arquivo_csv, 'ab', buffering=64 * 1024)
+        self._finalizador = weakref.finalize(self, self._arquivo.close)
+        self._tamanho = self._arquivo.tell()
+        self._pendentes = 0
+        self._assinar()
+
+    def _descarregar(self):
+        """Grava no disco as linhas ainda no buffer, para que as leituras as enxerguem."""
+        if self._pendentes and self._arquivo:
+            self._arquivo.flush()
+            self._assinar()
+        self._pendentes = 0
+
+    @staticmethod
+    def _estado(estado) -> Tuple[int, int, int]:
+        return estado.st_ino, estado.st_size, estado.st_mtime_ns
+
+    def _assinar(self):
+        self._assinatura = self._estado(os.fstat(self._arquivo.fileno()))
+
+    def _arquivo_mudou(self) -> bool:
+        """Se o arquivo no disco não é mais o que esta instância deixou (outro processo gravou ou compactou)."""
+        return self._estado(os.stat(self.arquivo_csv)) != self._assinatura
+
+    @contextmanager
+    def _travar_arquivo(self):
+        """Trava exclusiva entre processos (com a trava de threads já tomada, quando for o caso)."""
+        if fcntl:
+            fcntl.flock(self._trava.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(self._trava.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def _escrita(self):
+        """Trava para escrever: relê o arquivo se outro processo o mudou e termina com tudo no disco.
+
+        Os offsets do índice e o da próxima escrita ficam em memória e apontariam para as linhas erradas.
+        """
+        with self.lock, self._travar_arquivo():
+            try:
+                if self._arquivo_mudou():
+                    self._abrir_para_acrescimo()  # Se o arquivo foi trocado, o handle aponta para o antigo
+                    if self.indice_campo:
+                        self._carregar_indice()
+                    else:
+                        self._total = sum(1 for _ in self._percorrer())
+                    self._arquivo_recarregado()
+                yield
+            finally:
+                self._descarregar()  # Cada operação termina no disco, visível para os outros processos
+
+    def _sincronizar(self):
+        """Antes de uma leitura, relê o arquivo se outro processo o mudou."""
+        if self._arquivo_mudou():
+            with self._escrita():
+                pass
+
+    def close(self):
+        """Descarrega as escritas pendentes e fecha o arquivo; uma escrita depois disso o reabre."""
+        with self.lock:
+            if self._arquivo:
+                self._finalizador()
+                self._arquivo = None
+            self._pendentes = 0
+
+    def _ler_cabecalho(self) -> List[str]:
+        with open(self.arquivo_csv, 'r', newline='') as f:
+            return next(csv.reader(f), [])
+
+    def _reparar_final(self):
+        """Corta a linha incompleta que uma queda no meio de uma escrita deixa no fim do arquivo.
+
+        Sem isso a próxima linha gravada seria colada nela. Se a última linha estiver completa
+        e só faltar a quebra de linha, a quebra é acrescentada.
+        """
+        with open(self.arquivo_csv, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[-1:] == b"\n":
+                    return
+                inicio = mm.rfind(b"\n") + 1
+                # Sem quebra nenhuma a linha é o cabeçalho, já conferido antes
+                completa = not inicio or self._linha_completa(self._separar(mm[inicio:]))
+            if completa:
+                f.seek(0, os.SEEK_END)
+                f.write(b"\r\n")
+            else:
+                f.truncate(inicio)
+
+    def _linha_completa(self, valores: List[str]) -> bool:
+        """Se a linha tem todas as colunas, com _rev numérico e _deleted 0 ou 1."""
+        return len(valores) == len(self._colunas) and valores[-2].isdigit() and valores[-1] in ("0", "1")
+
+    def _migrar(self):
+        """Converte um CSV sem as colunas _rev/_deleted para o formato só de acréscimo."""
+        with open(self.arquivo_csv, 'r', newline='') as f:
+            linhas = [
+                self._formatar([row.get(campo) or "" for campo in self.campos] + [str(i), "0"])
+                for i, row in enumerate(csv.DictReader(f), 1)
+            ]
+        self._reescrever(linhas)
+
+    def _reescrever(self, linhas: List[bytes]):
+        """Sobrescreve o CSV inteiro com o cabeçalho e as linhas já formatadas, numa única escrita.
+
+        Grava num arquivo temporário e só então o troca pelo original com os.replace: uma queda
+        no meio da escrita deixa a tabela antiga intacta.
+        """
+        temporario = self.arquivo_csv + ".tmp"
+        with open(temporario, 'wb') as f:
+            f.write(self._formatar(self._colunas) + b"".join(linhas))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # O handle de acréscimo aponta para o arquivo antigo: fecha antes da troca e reabre depois
+        aberto = self._arquivo is not None
+        if aberto:
+            self._finalizador()
+            self._arquivo = None
+        os.replace(temporario, self.arquivo_csv)
+        if aberto:
+            self._abrir_para_acrescimo()
+
+    def _linhas_brutas(self, contendo=b"") -> Iterator[Tuple[int, bytes]]:
+        """Percorre o CSV mapeado em memória devolvendo (offset, bytes) das linhas de dados.
+
+        Com contendo, pula direto (via mmap.find) para as linhas que contêm esses bytes.
+        """
+        self._descarregar()
+        with open(self.arquivo_csv, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            offset = mm.find(b"\n") + 1  # Pular cabeçalho
+            if not offset:
+                return
+            tamanho = len(mm)
+            if not contendo:
+                yield from self._separar_em_blocos(mm, offset)
+                return
+            while offset < tamanho:
+                achado = mm.find(contendo, offset)
+                if achado == -1:
+                    return
+                offset = mm.rfind(b"\n", offset, achado) + 1 or offset
+                fim = mm.find(b"\n", offset)
+                if fim == -1:
+                    fim = tamanho
+                yield offset, mm[offset:fim]
+                offset = fim + 1
+
+    def _separar_em_blocos(self, mm, offset) -> Iterator[Tuple[int, bytes]]:
+        """Separa as linhas bloco a bloco com bytes.split, que roda em C, e calcula os offsets pelos tamanhos."""
+        tamanho = len(mm)
+        while offset < tamanho:
+            fim = min(offset + self.tamanho_bloco, tamanho)
+            if fim == tamanho and mm[fim - 1] == ord("\n"):
+                corte = fim - 1
+            else:
+                # Termina o bloco na última quebra de linha; a linha partida fica para o próximo
+                corte = mm.rfind(b"\n", offset, fim)
+                if corte == -1:
+                    corte = mm.find(b"\n", fim)  # Linha maior que o bloco
+                if corte == -1:
+                    corte = tamanho
+            linhas = mm[offset:corte].split(b"\n")
+            yield from zip(accumulate((len(linha) + 1 for linha in linhas), initial=offset), linhas)
+            offset = corte + 1
+
+    @staticmethod
+    def _separar(linha: bytes) -> List[str]:
+        """Separa os valores de uma linha; o módulo csv só é usado se houver aspas."""
+        if b'"' in linha:
+            return next(csv.reader([linha.decode()]), [])
+        linha = linha.rstrip(b"\r")
+        return linha.decode().split(",") if linha else []
+
+    def _percorrer(self) -> Iterator[Tuple[int, List[str]]]:
+        """Percorre as linhas de dados do CSV devolvendo (offset, valores)."""
+        for offset, linha in self._linhas_brutas():
+            valores = self._separar(linha)
+            if valores:
+                yield offset, valores
+
+    def _carregar_indice(self):
+        """Lê o CSV uma vez e monta o índice com a versão mais recente de cada chave."""
+        self._indice = {}
+        self._rev = self._mortas = 0
+        posicao = self.campos.index(self.indice_campo)
+        rev, deletado = len(self.campos), len(self.campos) + 1
+        for offset, valores in self._percorrer():
+            if not self._linha_completa(valores):
+                continue  # Linha corrompida: ignorada, como fazia o DictReader
+            chave = valores[posicao]
+            self._rev = max(self._rev, int(valores[rev]))
+            if chave in self._indice:
+                self._mortas += 1  # A versão anterior ficou obsoleta
+            if valores[deletado] == "1":
+                self._indice.pop(chave, None)
+                self._mortas += 1
+            else:
+                self._indice[chave] = offset
+
+    def _linhas_vivas(self) -> Iterator[Dict[str, str]]:
+        """Percorre o CSV devolvendo só a versão viva de cada linha."""
+        posicao = self.campos.index(self.indice_campo) if self.indice_campo else None
+        for offset, valores in self._percorrer():
+            if posicao is None or self._indice.get(valores[posicao]) == offset:
+                yield dict(zip(self.campos, valores))
+
+    def _procurar(self, campo, valor) -> Iterator[Dict[str, str]]:
+        """Devolve as linhas vivas com campo == valor, comparando os bytes antes de decodificar."""
+        if campo not in self.campos:
+            return
+        coluna = self.campos.index(campo)
+        valor = self._texto(valor)  # No arquivo tudo é texto
+        alvo = valor.encode()
+        posicao = self.campos.index(self.indice_campo) if self.indice_campo else None
+        # No arquivo as aspas do valor aparecem duplicadas pelo módulo csv
+        for offset, linha in self._linhas_brutas(alvo.replace(b'"', b'""')):
+            if b'"' not in linha:
+                brutos = linha.rstrip(b"\r").split(b",")
+                if len(brutos) <= coluna or brutos[coluna] != alvo:
+                    continue  # Linhas em branco ou com colunas faltando são puladas, como no DictReader
+            valores = self._separar(linha)
+            if len(valores) <= coluna or valores[coluna] != valor:
+                continue
+            if posicao is None or self._indice.get(valores[posicao]) == offset:
+                yield dict(zip(self.campos, valores))
+
+    def _ler_linha(self, offset):
+        """Lê a linha que começa no offset informado."""
+        return self._ler_linhas([offset])[0]
+
+    def _ler_linhas(self, offsets) -> List[Dict[str, str]]:
+        """Lê as linhas que começam nos offsets informados, abrindo o arquivo uma única vez."""
+        linhas = []
+        self._descarregar()
+        with open(self.arquivo_csv, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                linhas.append(dict(zip(self.campos, self._separar(f.readline().rstrip(b"\n")))))
+        return linhas
+
+    def _contar(self) -> int:
+        """Total de linhas vivas, sem varrer o arquivo."""
+        return len(self._indice) if self.indice_campo else self._total
+
+    def _salvar_dados(self, linha, deletado=False):
+        """Adiciona a linha ao fim do CSV e retorna o offset em que ela foi gravada."""
+        self._rev += 1
+        valores = [self._texto(linha[campo]) for campo in self.campos]
+        if self.indice_campo:
+            valores += [str(self._rev), "1" if deletado else "0"]
+        dados = self._formatar(valores)
+
+        if self._arquivo is None:
+            self._abrir_para_acrescimo()  # Fechado por close()
+        offset = self._tamanho
+        self._arquivo.write(dados)
+        self._tamanho += len(dados)
+        self._pendentes += 1
+        if self._pendentes >= self.linhas_por_flush:
+            self._descarregar()
+        return offset
+
+    def _formatar(self, valores: List[str]) -> bytes:
+        """Monta a linha do CSV; o writer do módulo csv só é usado se algum valor precisar de aspas."""
+        texto = ",".join(valores)
+        if '"' not in texto and texto.count(",") == len(valores) - 1 and (texto or len(valores) > 1):
+            return (texto + "\r\n").encode()
+        self._writer.writerow(valores)
+        texto = self._linha_csv.getvalue()
+        self._linha_csv.seek(0)
+        self._linha_csv.truncate()
+        return texto.encode()
+
+    def _gravar_versao(self, dados):
+        """Grava uma nova versão da linha e aponta o índice para ela."""
+        offset = self._salvar_dados(dados)
+        chave = dados[self.indice_campo]
+        if chave in self._indice:
+            self._mortas += 1
+        self._indice[chave] = offset
+        self._linha_gravada(dados)
+
+    def _gravar_delecao(self, linha):
+        """Grava a marca de deleção da linha e a remove do índice."""
+        self._salvar_dados(linha, deletado=True)
+        del self._indice[linha[self.indice_campo]]
+        self._mortas += 2  # A versão removida e a própria marca
+        self._linha_removida(linha)
+
+    def _linha_gravada(self, linha):
+        """Chamado após gravar uma versão viva; subclasses mantêm seus índices aqui."""
+
+    def _linha_removida(self, linha):
+        """Chamado após gravar uma marca de deleção; subclasses mantêm seus índices aqui."""
+
+    def _arquivo_recarregado(self):
+        """Chamado após reler o arquivo mudado por outro processo; subclasses refazem índices e caches aqui."""
+
+    def _talvez_compactar(self):
+        if self._mortas > max(self.limite_compactacao, len(self._indice)):
+            self._compactar()
+
+    def _compactar(self):
+        # Copia os bytes das linhas vivas sem decodificá-las, na ordem do índice (a de inserção das chaves)
+        vivas = set(self._indice.values())
+        brutas = {offset: linha for offset, linha in self._linhas_brutas() if offset in vivas}
+        linhas = [brutas[offset] + b"\n" for offset in self._indice.values()]
+        self._reescrever(linhas)
+
+        # Os novos offsets saem dos tamanhos das linhas, sem reler o arquivo
+        offset = len(self._formatar(self._colunas))
+        for chave, linha in zip(list(self._indice), linhas):
+            self._indice[chave] = offset
+            offset += len(linha)
+        self._mortas = 0
 
     def _buscar_no_csv(self, campo, valor):
         """Busca uma linha diretamente no CSV usando uma busca linear, evita carregar tudo em memória."""
-        with open(self.arquivo_csv, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row.get(campo) == valor:
-                    return row
-        return None
+        # Campo indexado: um acesso ao dicionário e uma leitura no offset
+        if campo == self.indice_campo:
+            offset = self._indice.get(self._texto(valor))
+            return None if offset is None else self._ler_linha(offset)
+
+        return next(self._procurar(campo, valor), None)
+
+    def _buscar_todas(self, campo, valor) -> List[Dict[str, str]]:
+        if campo == self.indice_campo:
+            linha = self._buscar_no_csv(campo, valor)
+            return [linha] if linha else []
+        return list(self._procurar(campo, valor))
+
+    def _validar(self, dados: Dict[str, str], parcial=False):
+        if not parcial and not all(campo in dados for campo in self.campos):
+            raise ValueError("Dados inválidos. Faltam campos.")
+        desconhecidos = [campo for campo in dados if campo not in self.campos]
+        if desconhecidos:
+            raise ValueError(f"Dados inválidos. Campos desconhecidos: {', '.join(map(str, desconhecidos))}.")
+        if any("\n" in str(valor) or "\r" in str(valor) for valor in dados.values()):
+            raise ValueError("Dados inválidos. Quebras de linha não são suportadas.")
+
+    @staticmethod
+    def _texto(valor) -> str:
+        """Texto gravado no CSV para um valor (None vira vazio, como no DictWriter)."""
+        return "" if valor is None else str(valor)
+
+    @classmethod
+    def _normalizar(cls, dados) -> Dict[str, str]:
+        """Converte os valores para o texto que vai para o CSV.
+
+        O índice, os hooks e os caches usam a linha normalizada, igual à que será lida de volta.
+        """
+        return {campo: cls._texto(valor) for campo, valor in dados.items()}
+
+    def _inserir(self, dados: Dict[str, str]) -> Dict[str, str]:
+        return self._inserir_em_lote([dados])[0]
+
+    def _inserir_em_lote(self, linhas: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Grava as linhas e as devolve normalizadas."""
+        # Validar todas as linhas antes de gravar qualquer uma
+        for dados in linhas:
+            self._validar(dados)
+        linhas = [self._normalizar(dados) for dados in linhas]
+
+        if self.indice_campo:
+            chaves = set()
+            for dados in linhas:
+                chave = dados[self.indice_campo]
+                if chave in self._indice or chave in chaves:
+                    raise ValueError(f"Dados inválidos. Já existe uma linha com {self.indice_campo} = {chave}.")
+                chaves.add(chave)
+            for dados in linhas:
+                self._gravar_versao(dados)
+            self._talvez_compactar()
+        else:
+            for dados in linhas:
+                self._salvar_dados(dados)
+            self._total += len(linhas)
+        return linhas
+
+    def _atualizar(self, campo_busca, valor_busca, novos_dados) -> int:
+        self._validar(novos_dados, parcial=True)
+        novos_dados = self._normalizar(novos_dados)
+        valor_busca = self._texto(valor_busca)
+        if not self.indice_campo:
+            return self._reescrever_atualizando(campo_busca, valor_busca, novos_dados)
+
+        alvos = self._buscar_todas(campo_busca, valor_busca)
+        nova_chave = novos_dados.get(self.indice_campo)
+        if nova_chave in self._indice and any(linha[self.indice_campo] != nova_chave for linha in alvos):
+            raise ValueError(f"Dados inválidos. Já existe uma linha com {self.indice_campo} = {nova_chave}.")
+        for linha in alvos:
+            nova = {**linha, **novos_dados}
+            if nova[self.indice_campo] != linha[self.indice_campo]:
+                self._gravar_delecao(linha)  # A chave mudou: a antiga deixa de existir
+            self._gravar_versao(nova)
+        self._talvez_compactar()
+        return len(alvos)
+
+    def _deletar(self, campo, valor) -> int:
+        valor = self._texto(valor)
+        if not self.indice_campo:
+            return self._reescrever_deletando(campo, valor)
+
+        alvos = self._buscar_todas(campo, valor)
+        for linha in alvos:
+            self._gravar_delecao(linha)
+        self._talvez_compactar()
+        return len(alvos)
+
+    def _reescrever_atualizando(self, campo_busca, valor_busca, novos_dados) -> int:
+        """Sem índice não há chave para versionar: atualiza reescrevendo o CSV."""
+        if campo_busca not in self.campos:
+            return 0
+        coluna = self.campos.index(campo_busca)
+        linhas_atualizadas = 0
+        novas_linhas = []
+        for _, linha in self._linhas_brutas():
+            valores = self._separar(linha)
+            if len(valores) > coluna and valores[coluna] == valor_busca:
+                row = {**dict(zip(self.campos, valores)), **novos_dados}
+                linha = self._formatar([self._texto(row[campo]) for campo in self.campos]).rstrip(b"\n")
+                linhas_atualizadas += 1
+            novas_linhas.append(linha + b"\n")  # As demais linhas são copiadas como estão
+
+        # Sobrescrever o CSV com as linhas atualizadas (só se algo mudou)
+        if linhas_atualizadas:
+            self._reescrever(novas_linhas)
+        return linhas_atualizadas
+
+    def _reescrever_deletando(self, campo, valor) -> int:
+        """Sem índice não há chave para marcar como deletada: remove reescrevendo o CSV."""
+        if campo not in self.campos:
+            return 0
+        coluna = self.campos.index(campo)
+        novas_linhas = []
+        linhas_deletadas = 0
+        for _, linha in self._linhas_brutas():
+            valores = self._separar(linha)
+            if len(valores) > coluna and valores[coluna] == valor:
+                linhas_deletadas += 1
+                continue  # Pular linha a ser deletada
+            novas_linhas.append(linha + b"\n")
+
+        # Sobrescrever o CSV com as linhas que restaram (só se algo foi removido)
+        if linhas_deletadas:
+            self._reescrever(novas_linhas)
+            self._total -= linhas_deletadas
+        return linhas_deletadas
 
     def inserir(self, dados: Dict[str, str]):
-        """Insere dados no CSV e os adiciona ao cache, respeitando o limite de memória."""
-        with self.lock:
-            # Validar dados
-            if not all(campo in dados for campo in self.campos):
-                raise ValueError("Dados inválidos. Faltam campos.")
+        """Insere dados no CSV."""
+        with self._escrita():
+            self._inserir(dados)
+
+    def buscar(self, campo: str, valor: str) -> Optional[Dict[str, str]]:
+        """Busca um dado no CSV."""
+        self._sincronizar()
+        with self.lock.leitura():
+            return self._buscar_no_csv(campo, valor)
+
+    def atualizar(self, campo_busca: str, valor_busca: str, novos_dados: Dict[str, str]):
+        """Atualiza as linhas encontradas gravando uma nova versão de cada uma."""
+        with self._escrita():
+            return self._atualizar(campo_busca, valor_busca, novos_dados)
 
-            # Inserir dados no arquivo CSV
-            self._salvar_dados(dados)
+    def deletar(self, campo: str, valor: str):
+        """Remove as linhas encontradas gravando uma marca de deleção para cada uma."""
+        with self._escrita():
+            return self._deletar(campo, valor)
+
+    def compactar(self):
+        """Reescreve o CSV mantendo só a versão viva de cada linha."""
+        with self._escrita():
+            if self.indice_campo:
+                self._compactar()
+
+class Tabela(TabelaCSV):
+    def __init__(self, nome, campos, indice_campo=None, cache_limit=100):
+        super().__init__(nome, campos, indice_campo)
+        self.cache_limit = cache_limit  # Limite de cache em memória
+        self.cache = OrderedDict()  # Cache LRU {(campo, valor): linha}
+        self._cache_lock = Lock()  # Leitores simultâneos também alteram o cache
+
+    def _guardar_no_cache(self, campo, valor, linha):
+        """Guarda a linha no cache LRU, descartando a menos usada se passar do limite."""
+        chave = (campo, valor)
+        self.cache[chave] = linha
+        self.cache.move_to_end(chave)
+        if len(self.cache) > self.cache_limit:
+            self.cache.popitem(last=False)
+
+    def _invalidar_cache(self, expirada):
+        """Remove do cache as entradas para as quais expirada(campo, valor, linha) é verdadeiro."""
+        for chave in [c for c, linha in self.cache.items() if expirada(c[0], c[1], linha)]:
+            del self.cache[chave]
+
+    def _arquivo_recarregado(self):
+        self.cache.clear()
+
+    def inserir(self, dados: Dict[str, str]):
+        """Insere dados no CSV e os adiciona ao cache, respeitando o limite de memória."""
+        with self._escrita():
+            dados = self._inserir(dados)
 
             # Atualizar cache
-            self.cache.append(dados)
+            if self.indice_campo:
+                self._guardar_no_cache(self.indice_campo, dados[self.indice_campo], dados)
 
     def buscar(self, campo: str, valor: str) -> Optional[Dict[str, str]]:
         """Busca um dado no cache e, se não encontrar, busca no CSV."""
-        with self.lock:
+        valor = self._texto(valor)
+        self._sincronizar()
+        with self.lock.leitura():
             # Tentar encontrar no cache
-            for linha in self.cache:
-                if linha.get(campo) == valor:
-                    return linha
+            chave = (campo, valor)
+            with self._cache_lock:
+                if chave in self.cache:
+                    self.cache.move_to_end(chave)  # Marcar como usada recentemente
+                    return self.cache[chave]
 
             # Caso não esteja no cache, buscar no CSV
             resultado = self._buscar_no_csv(campo, valor)
             if resultado:
-                # Adicionar ao cache (o mais recente fica no cache)
-                self.cache.append(resultado)
+                with self._cache_lock:
+                    self._guardar_no_cache(campo, valor, resultado)
             return resultado
 
     def atualizar(self, campo_busca: str, valor_busca: str, novos_dados: Dict[str, str]):
         """Atualiza uma linha no CSV e no cache."""
-        with self.lock:
-            linhas_atualizadas = 0
-            novas_linhas = []
-            with open(self.arquivo_csv, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get(campo_busca) == valor_busca:
-                        for k, v in novos_dados.items():
-                            row[k] = v
-                        linhas_atualizadas += 1
-                        self.cache.append(row)  # Atualizar cache com a linha modificada
-                    novas_linhas.append(row)
-
-            # Sobrescrever o CSV com as linhas atualizadas
-            with open(self.arquivo_csv, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.campos)
-                writer.writeheader()
-                writer.writerows(novas_linhas)
+        with self._escrita():
+            novos_dados = self._normalizar(novos_dados)
+            valor_busca = self._texto(valor_busca)
+            linhas_atualizadas = self._atualizar(campo_busca, valor_busca, novos_dados)
 
+            # Remover do cache as linhas alteradas e as buscas que os novos valores podem afetar
+            if linhas_atualizadas:
+                self._invalidar_cache(
+                    lambda c, v, linha: linha.get(campo_busca) == valor_busca or novos_dados.get(c) == v
+                )
             return linhas_atualizadas
 
     def deletar(self, campo: str, valor: str):
         """Remove uma linha do CSV e atualiza o cache."""
-        with self.lock:
-            novas_linhas = []
-            linhas_deletadas = 0
-            with open(self.arquivo_csv, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get(campo) == valor:
-                        linhas_deletadas += 1
-                        continue  # Pular linha a ser deletada
-                    novas_linhas.append(row)
-
-            # Sobrescrever o CSV com as linhas que restaram
-            with open(self.arquivo_csv, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.campos)
-                writer.writeheader()
-                writer.writerows(novas_linhas)
+        valor = self._texto(valor)
+        with self._escrita():
+            linhas_deletadas = self._deletar(campo, valor)
 
             # Atualizar o cache, removendo itens deletados
-            self.cache = deque((linha for linha in self.cache if linha.get(campo) != valor), maxlen=self.cache_limit)
+            if linhas_deletadas:
+                self._invalidar_cache(lambda c, v, linha: linha.get(campo) == valor)
             return linhas_deletadas
 
 # Exemplo de uso
@@ -1,155 +1,340 @@
-import csv
-import os
-from collections import deque
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from itertools import accumulate, count, islice
 from threading import Lock
 from typing import Optional, List, Dict, Tuple
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, jsonify, request, render_template_string
+from flask.json.provider import JSONProvider
 from math import ceil
+import hashlib
+import json
 import random
 
-class Tabela:
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele o Flask usa o json da biblioteca padrão
+    orjson = None
+
+from db import TabelaCSV
+
+class Tabela(TabelaCSV):
     def __init__(self, nome, campos, indice_campo=None, cache_limit=100):
-        self.nome = nome
-        self.campos = campos
-        self.indice_campo = indice_campo
-        self.lock = Lock()
+        super().__init__(nome, campos, indice_campo)
         self.cache_limit = cache_limit
-        self.cache = {}  # Cache para páginas de resultados {page_number: [data]}
-        self.cache_access = deque(maxlen=self.cache_limit)  # Controla páginas no cache com limite de memória
-        self.arquivo_csv = f"{nome}.csv"
-        
-        if not os.path.exists(self.arquivo_csv):
-            with open(self.arquivo_csv, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.campos)
-                writer.writeheader()
-
-    def _salvar_dados(self, linha):
-        with open(self.arquivo_csv, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=self.campos)
-            writer.writerow(linha)
-
-    def _buscar_no_csv_paginado(self, page: int, per_page: int) -> Tuple[List[Dict[str, str]], int]:
-        """Busca diretamente no CSV se a página solicitada não estiver no cache."""
-        with open(self.arquivo_csv, 'r') as f:
-            reader = list(csv.DictReader(f))
-            total_items = len(reader)
-            start = (page - 1) * per_page
-            end = start + per_page
-            page_data = reader[start:end]
-            return page_data, total_items
+        # Cache LRU de páginas: {(page, per_page): ([data], posição da última linha)}
+        # e {(nome, page, per_page): ([data], total_items)}
+        self.cache = OrderedDict()
+        self._cache_lock = Lock()  # Leitores simultâneos também alteram o cache
+        self._totais_por_nome = OrderedDict()  # Total de resultados por busca de nome {nome: total_items}
+        self._carregar_nomes()
+
+    def _arquivo_recarregado(self):
+        self._limpar_cache()
+        self._carregar_nomes()
+
+    @staticmethod
+    def _trigramas_de(texto: str):
+        return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+    def _carregar_nomes(self):
+        """Monta o índice de trigramas do campo nome a partir das linhas vivas."""
+        self._nomes = {}  # {chave: (posição na tabela, nome em minúsculas)}
+        self._trigramas = defaultdict(set)  # Índice invertido {trigrama do nome: {chaves}}
+        self._posicoes = count()
+        self._coluna_nome = None  # (nomes unidos por "\n", início de cada um, chaves), montada sob demanda
+        if not self.indice_campo:
+            return
+        nomes = {row[self.indice_campo]: row.get('nome', "") for row in self._linhas_vivas()}
+        for chave in self._indice:  # Na ordem do índice, a mesma da listagem
+            self._indexar_nome(chave, nomes[chave])
+
+    def _indexar_nome(self, chave, nome):
+        anterior = self._nomes.get(chave)
+        if anterior:
+            self._desindexar_nome(chave)
+        nome = nome.lower()
+        self._nomes[chave] = (anterior[0] if anterior else next(self._posicoes), nome)
+        for trigrama in self._trigramas_de(nome):
+            self._trigramas[trigrama].add(chave)
+
+    def _desindexar_nome(self, chave):
+        _, nome = self._nomes.pop(chave)
+        for trigrama in self._trigramas_de(nome):
+            self._trigramas[trigrama].discard(chave)
+            if not self._trigramas[trigrama]:
+                del self._trigramas[trigrama]
+
+    def _linha_gravada(self, linha):
+        # A linha já está no arquivo: o hook não pode falhar (chega normalizada, só com textos)
+        chave = linha[self.indice_campo]
+        anterior = self._nomes.get(chave)
+        self._indexar_nome(chave, linha.get('nome', ""))
+        self._coluna_nome = None
+        posicao, nome = self._nomes[chave]
+        if anterior:
+            # Mesma chave: a linha fica no mesmo lugar, só o conteúdo muda
+            self._invalidar_paginas(nomes=(anterior[1], nome), linha={c: linha[c] for c in self.campos})
+        else:
+            self._invalidar_paginas(posicao=posicao, nomes=(nome,))
+
+    def _linha_removida(self, linha):
+        posicao, nome = self._nomes[linha[self.indice_campo]]
+        self._desindexar_nome(linha[self.indice_campo])
+        self._coluna_nome = None
+        self._invalidar_paginas(posicao=posicao, nomes=(nome,))
+
+    def _invalidar_paginas(self, posicao=None, nomes=(), linha=None):
+        """Remove do cache só as páginas que uma escrita pode ter mudado.
+
+        posicao: a partir dela as linhas da listagem se deslocaram (inserção ou remoção);
+        nomes: nomes da linha antes e depois da escrita, para as buscas por nome;
+        linha: nova versão de uma linha que ficou no mesmo lugar, trocada nas listagens.
+        """
+        for cache_key, (page_data, extra) in list(self.cache.items()):
+            if len(cache_key) == 3:
+                if any(cache_key[0] in nome for nome in nomes):
+                    del self.cache[cache_key]
+            elif posicao is not None:
+                # Página incompleta (fim da tabela) ou que vai até depois da posição alterada
+                if len(page_data) < cache_key[1] or extra >= posicao:
+                    del self.cache[cache_key]
+            elif linha is not None:
+                chave = linha[self.indice_campo]
+                if any(row[self.indice_campo] == chave for row in page_data):
+                    # Nova lista: a antiga pode estar sendo serializada por quem a recebeu
+                    page_data = [linha if row[self.indice_campo] == chave else row for row in page_data]
+                    self.cache[cache_key] = (page_data, extra)
+
+    def _filtrar_na_coluna(self, nome: str) -> List[str]:
+        """Procura o texto com str.find sobre todos os nomes unidos num único texto.
+
+        A varredura roda em C; o Python só trabalha em cada ocorrência encontrada.
+        """
+        if self._coluna_nome is None:
+            itens = sorted(self._nomes.items(), key=lambda item: item[1][0])
+            nomes = [nome_lower for _, (_, nome_lower) in itens]
+            inicios = [0, *accumulate(len(n) + 1 for n in nomes)]  # O último marca o fim do texto
+            self._coluna_nome = ("\n".join(nomes), inicios, [chave for chave, _ in itens])
+        texto, inicios, chaves = self._coluna_nome
+        if not chaves or "\n" in nome:
+            return []
+
+        achados = []
+        i = texto.find(nome)
+        while i != -1:
+            linha = bisect_right(inicios, i) - 1
+            achados.append(chaves[linha])
+            i = texto.find(nome, inicios[linha + 1])  # Continua no nome seguinte
+        return achados
+
+    def _filtrar_por_nome(self, nome: str) -> List[str]:
+        """Chaves das linhas cujo nome contém o texto, na ordem da tabela."""
+        nome = nome.lower()
+        trigramas = self._trigramas_de(nome)
+        if not trigramas:
+            return self._filtrar_na_coluna(nome)  # Texto com menos de 3 letras: confere todos os nomes
+
+        # Só as chaves presentes em todas as listas de trigramas podem conter o texto
+        listas = sorted((self._trigramas.get(t, set()) for t in trigramas), key=len)
+        candidatos = set.intersection(*listas)
+        achados = [(self._nomes[chave][0], chave) for chave in candidatos if nome in self._nomes[chave][1]]
+        return [chave for _, chave in sorted(achados)]
+
+    def _buscar_no_csv_paginado(self, page: int, per_page: int) -> Tuple[List[Dict[str, str]], int, Optional[int]]:
+        """Busca diretamente no CSV se a página solicitada não estiver no cache.
+
+        Devolve também a posição da última linha da página (None sem índice), usada para invalidá-la.
+        """
+        # Páginas menores que 1 saem vazias, como no fatiamento de lista
+        start = max(0, (page - 1) * per_page)
+        end = max(start, page * per_page)
+        if self.indice_campo:
+            # O índice guarda os offsets na ordem das linhas: lê só os da página
+            itens = list(islice(self._indice.items(), start, end))
+            page_data = self._ler_linhas(offset for _, offset in itens)
+            # A posição sai da chave do índice, não do valor relido do arquivo
+            ultima = self._nomes[itens[-1][0]][0] if itens else None
+        else:
+            page_data = list(islice(self._linhas_vivas(), start, end))
+            ultima = None
+        return page_data, self._contar(), ultima
+
+    def _guardar_pagina(self, cache_key, page_data, extra):
+        """Guarda a página no cache LRU, descartando a menos usada se passar do limite."""
+        self.cache[cache_key] = (page_data, extra)
+        self.cache.move_to_end(cache_key)
+        if len(self.cache) > self.cache_limit:
+            self.cache.popitem(last=False)
 
     def _limpar_cache(self):
         """Limpa o cache de páginas."""
         self.cache.clear()
-        self.cache_access.clear()
+        self._totais_por_nome.clear()
+
+    # Com índice, _linha_gravada/_linha_removida invalidam só as páginas afetadas;
+    # sem índice não há como saber quais linhas mudaram e o cache é limpo inteiro.
 
     def inserir(self, dados: Dict[str, str]):
-        with self.lock:
-            if not all(campo in dados for campo in self.campos):
-                raise ValueError("Dados inválidos. Faltam campos.")
-            self._salvar_dados(dados)
-            self._limpar_cache()  # Limpar cache ao inserir
+        with self._escrita():
+            self._inserir(dados)
+            if not self.indice_campo:
+                self._limpar_cache()  # Limpar cache ao inserir
+
+    def inserir_em_lote(self, linhas: List[Dict[str, str]]):
+        """Insere várias linhas de uma vez, limpando o cache (se preciso) uma única vez no final."""
+        with self._escrita():
+            self._inserir_em_lote(linhas)
+            if not self.indice_campo:
+                self._limpar_cache()
 
     def buscar_paginado(self, page: int, per_page: int) -> Tuple[List[Dict[str, str]], int, int]:
         """Retorna uma página de dados, primeiro tentando o cache e, se necessário, buscando no CSV."""
         cache_key = (page, per_page)
-        
-        # Tentar encontrar no cache
-        if cache_key in self.cache:
-            print(f"Cache hit for page {page}")
-            return self.cache[cache_key], page, len(self.cache)
-
-        # Buscar no CSV se não estiver no cache
-        page_data, total_items = self._buscar_no_csv_paginado(page, per_page)
-        
-        # Armazenar a página no cache
-        self.cache[cache_key] = page_data
-        self.cache_access.append(cache_key)  # Manter controle de limite no cache
-
-        # Limitar o tamanho do cache
-        if len(self.cache_access) > self.cache_limit:
-            oldest_key = self.cache_access.popleft()
-            del self.cache[oldest_key]
+
+        self._sincronizar()
+        with self.lock.leitura():
+            # Tentar encontrar no cache
+            with self._cache_lock:
+                if cache_key in self.cache:
+                    self.cache.move_to_end(cache_key)  # Marcar como usada recentemente
+                    print(f"Cache hit for page {page}")
+                    page_data, _ = self.cache[cache_key]
+                    return page_data, page, ceil(self._contar() / per_page)
+
+            # Buscar no CSV se não estiver no cache
+            page_data, total_items, ultima = self._buscar_no_csv_paginado(page, per_page)
+
+            # Armazenar a página no cache com a posição da última linha, usada para invalidá-la
+            with self._cache_lock:
+                self._guardar_pagina(cache_key, page_data, ultima)
 
         return page_data, page, ceil(total_items / per_page)
     
     def buscar_por_nome_paginado(self, nome: str, page: int, per_page: int) -> Tuple[List[Dict[str, str]], int, int]:
         """Busca usuários por nome com paginação."""
+        nome = nome.lower()  # A busca ignora maiúsculas: normaliza uma vez para o cache e os filtros
         cache_key = (nome, page, per_page)
-        
-        # Tentar encontrar no cache
-        if cache_key in self.cache:
-            print(f"Cache hit for search by name: {nome}, page {page}")
-            return self.cache[cache_key], page, len(self.cache)
-
-        # Buscar no CSV
-        with open(self.arquivo_csv, 'r') as f:
-            reader = list(csv.DictReader(f))
-            filtro_nome = [row for row in reader if nome.lower() in row['nome'].lower()]
-            total_items = len(filtro_nome)
-            start = (page - 1) * per_page
-            end = start + per_page
-            page_data = filtro_nome[start:end]
-            
-        # Armazenar a página no cache
-        self.cache[cache_key] = page_data
-        self.cache_access.append(cache_key)
-
-        # Limitar o tamanho do cache
-        if len(self.cache_access) > self.cache_limit:
-            oldest_key = self.cache_access.popleft()
-            del self.cache[oldest_key]
+        start = max(0, (page - 1) * per_page)  # Páginas menores que 1 saem vazias
+        end = max(start, page * per_page)
+
+        self._sincronizar()
+        with self.lock.leitura():
+            # Tentar encontrar no cache
+            with self._cache_lock:
+                if cache_key in self.cache:
+                    self.cache.move_to_end(cache_key)  # Marcar como usada recentemente
+                    print(f"Cache hit for search by name: {nome}, page {page}")
+                    page_data, total_items = self.cache[cache_key]
+                    return page_data, page, ceil(total_items / per_page)
+
+            if self.indice_campo:
+                # Filtrar pelo índice de trigramas e ler do CSV só as linhas da página
+                chaves = self._filtrar_por_nome(nome)
+                total_items = len(chaves)
+                page_data = self._ler_linhas(self._indice[chave] for chave in chaves[start:end])
+            else:
+                page_data, total_items = self._buscar_no_csv_por_nome(nome, start, end)
+
+            # Armazenar a página no cache
+            with self._cache_lock:
+                self._guardar_pagina(cache_key, page_data, total_items)
 
         return page_data, page, ceil(total_items / per_page)
 
+    def _buscar_no_csv_por_nome(self, nome: str, start: int, end: int) -> Tuple[List[Dict[str, str]], int]:
+        """Sem índice, varre o CSV em fluxo guardando só a página pedida (nome já em minúsculas).
+
+        Se o total desse nome já é conhecido, para no fim da página; senão só conta o resto.
+        """
+        with self._cache_lock:
+            total_items = self._totais_por_nome.get(nome)
+        filtro_nome = (row for row in self._linhas_vivas() if nome in row['nome'].lower())
+        pulados = sum(1 for _ in islice(filtro_nome, start))
+        page_data = list(islice(filtro_nome, end - start))
+        if total_items is None:
+            total_items = pulados + len(page_data) + sum(1 for _ in filtro_nome)
+
+        with self._cache_lock:
+            self._totais_por_nome[nome] = total_items
+            self._totais_por_nome.move_to_end(nome)
+            if len(self._totais_por_nome) > self.cache_limit:
+                self._totais_por_nome.popitem(last=False)
+        return page_data, total_items
 
     def atualizar(self, campo_busca: str, valor_busca: str, novos_dados: Dict[str, str]):
-        with self.lock:
-            linhas_atualizadas = 0
-            novas_linhas = []
-            with open(self.arquivo_csv, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get(campo_busca) == valor_busca:
-                        for k, v in novos_dados.items():
-                            row[k] = v
-                        linhas_atualizadas += 1
-                    novas_linhas.append(row)
-            with open(self.arquivo_csv, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.campos)
-                writer.writeheader()
-                writer.writerows(novas_linhas)
-            self._limpar_cache()  # Limpar cache ao atualizar
+        with self._escrita():
+            linhas_atualizadas = self._atualizar(campo_busca, valor_busca, novos_dados)
+            if linhas_atualizadas and not self.indice_campo:
+                self._limpar_cache()  # Limpar cache ao atualizar
             return linhas_atualizadas
 
     def deletar(self, campo: str, valor: str):
-        with self.lock:
-            novas_linhas = []
-            linhas_deletadas = 0
-            with open(self.arquivo_csv, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get(campo) == valor:
-                        linhas_deletadas += 1
-                        continue
-                    novas_linhas.append(row)
-            with open(self.arquivo_csv, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=self.campos)
-                writer.writeheader()
-                writer.writerows(novas_linhas)
-            self._limpar_cache()  # Limpar cache ao deletar
+        with self._escrita():
+            linhas_deletadas = self._deletar(campo, valor)
+            if linhas_deletadas and not self.indice_campo:
+                self._limpar_cache()  # Limpar cache ao deletar
             return linhas_deletadas
 
+class OrjsonProvider(JSONProvider):
+    """Serializa as respostas do jsonify com orjson, bem mais rápido que o json padrão."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 app = Flask(__name__)
+if orjson:
+    app.json = OrjsonProvider(app)
+
 usuarios = Tabela("usuarios", ["id", "nome", "idade"], indice_campo="id", cache_limit=10)
 
-# Inserir 1000 usuários de teste
-for i in range(1, 1001):
-    usuarios.inserir({
-        "id": str(i),
-        "nome": f"User {i}",
-        "idade": str(random.randint(18, 60))
-    })
+def _popular_usuarios_de_teste():
+    """Insere 1000 usuários de teste se a tabela estiver vazia."""
+    if usuarios._contar():
+        return
+    usuarios.inserir_em_lote([
+        {"id": str(i), "nome": f"User {i}", "idade": str(random.randint(18, 60))}
+        for i in range(1, 1001)
+    ])
+
+
+# Corpos JSON já serializados das páginas mais pedidas {chave da rota: (dados, total_pages, corpo, etag)}
+_respostas = OrderedDict()
+_respostas_lock = Lock()
+
+def _resposta_da_pagina(chave, dados, page, per_page, total_pages):
+    """Responde uma página reaproveitando o JSON já serializado.
+
+    Vale enquanto o cache de páginas devolver o mesmo objeto `dados` (ele é trocado por outro
+    quando a página muda) e o total de páginas for o mesmo.
+    """
+    with _respostas_lock:
+        guardada = _respostas.get(chave)
+        if guardada and guardada[0] is dados and guardada[1] == total_pages:
+            _respostas.move_to_end(chave)
+            corpo, etag = guardada[2], guardada[3]
+        else:
+            corpo = None
+
+    if corpo is None:
+        pagina = {"page": page, "per_page": per_page, "total_pages": total_pages, "data": dados}
+        corpo = orjson.dumps(pagina) if orjson else json.dumps(pagina).encode()
+        etag = hashlib.sha1(corpo).hexdigest()
+        with _respostas_lock:
+            _respostas[chave] = (dados, total_pages, corpo, etag)
+            _respostas.move_to_end(chave)
+            if len(_respostas) > usuarios.cache_limit:
+                _respostas.popitem(last=False)
+
+    resposta = Response(corpo, mimetype="application/json")
+    resposta.set_etag(etag)
+    return resposta.make_conditional(request)
 
 
 html_template = """
@@ -282,12 +467,7 @@ def buscar_usuarios():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     dados, page, total_pages = usuarios.buscar_paginado(page, per_page)
-    return jsonify({
-        "page": page,
-        "per_page": per_page,
-        "total_pages": total_pages,
-        "data": dados
-    })
+    return _resposta_da_pagina(("usuarios", page, per_page), dados, page, per_page, total_pages)
 
 @app.route('/usuarios/buscar', methods=['GET'])
 def buscar_usuarios_por_nome():
@@ -295,18 +475,16 @@ def buscar_usuarios_por_nome():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     dados, page, total_pages = usuarios.buscar_por_nome_paginado(nome, page, per_page)
-    
-    return jsonify({
-        "page": page,
-        "per_page": per_page,
-        "total_pages": total_pages,
-        "data": dados
-    })
+    chave = ("buscar", nome.lower(), page, per_page)
+    return _resposta_da_pagina(chave, dados, page, per_page, total_pages)
 
 @app.route('/usuarios/<id>', methods=['PUT'])
 def atualizar_usuario(id):
     novos_dados = request.json
-    atualizado = usuarios.atualizar("id", id, novos_dados)
+    try:
+        atualizado = usuarios.atualizar("id", id, novos_dados)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     if atualizado:
         return jsonify({"message": f"{atualizado} usuário(s) atualizado(s)."})
     else:
@@ -321,4 +499,6 @@ def deletar_usuario(id):
         return jsonify({"error": "Usuário não encontrado para deletar."}), 404
 
 if __name__ == '__main__':
+    # Fora do import, para que cada worker (gunicorn/uwsgi) não reinsira os dados ao subir
+    _popular_usuarios_de_teste()
     app.run(debug=True)
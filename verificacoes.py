@@ -0,0 +1,98 @@
+"""Verificações aleatórias das otimizações do armazenamento.
+
+Uso: python verificacoes.py
+"""
+import contextlib
+import io
+import os
+import random
+import tempfile
+
+def verificar_cache_de_paginas(operacoes=3000, semente=0):
+    """Confere as páginas do cache (invalidadas só em parte a cada escrita) contra um modelo em memória."""
+    from flask_db import Tabela
+
+    aleatorio = random.Random(semente)
+    tabela = Tabela("verificacao", ["id", "nome", "idade"], indice_campo="id", cache_limit=50)
+    tabela.limite_compactacao = 50  # Compacta várias vezes durante a verificação
+    modelo = {}  # {id: linha}, na ordem da tabela
+    proximo_id = 0
+    nomes = ["ana", "Bruno", "carla", "ANA maria", "bia", "b", ""]
+
+    def novo_nome():
+        return aleatorio.choice(nomes) + str(aleatorio.randint(0, 20))
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Os acertos do cache são impressos
+        for _ in range(operacoes):
+            operacao = aleatorio.random()
+            if operacao < 0.25 or not modelo:
+                proximo_id += 1
+                linha = {"id": str(proximo_id), "nome": novo_nome(), "idade": str(aleatorio.randint(18, 60))}
+                tabela.inserir(linha)
+                modelo[linha["id"]] = linha
+            elif operacao < 0.4:
+                chave = aleatorio.choice(list(modelo))
+                nome = novo_nome()
+                tabela.atualizar("id", chave, {"nome": nome})
+                modelo[chave] = {**modelo[chave], "nome": nome}
+            elif operacao < 0.45:
+                # Troca de chave: a linha vai para o fim da tabela
+                chave = aleatorio.choice(list(modelo))
+                proximo_id += 1
+                tabela.atualizar("id", chave, {"id": str(proximo_id)})
+                modelo[str(proximo_id)] = {**modelo.pop(chave), "id": str(proximo_id)}
+            elif operacao < 0.55:
+                chave = aleatorio.choice(list(modelo))
+                tabela.deletar("id", chave)
+                del modelo[chave]
+            elif operacao < 0.8:
+                page, per_page = aleatorio.randint(0, 6), aleatorio.choice([3, 5, 10])
+                linhas = list(modelo.values())
+                esperado = linhas[max(0, (page - 1) * per_page):max(0, page * per_page)]
+                dados, _, total_pages = tabela.buscar_paginado(page, per_page)
+                assert dados == esperado, ("listagem", page, per_page)
+                assert total_pages == -(-len(linhas) // per_page), ("total da listagem", page, per_page)
+            else:
+                nome = aleatorio.choice(["an", "a", "B", "ana m", "1", "bia1"])
+                page, per_page = aleatorio.randint(1, 4), aleatorio.choice([3, 5])
+                linhas = [linha for linha in modelo.values() if nome.lower() in linha["nome"].lower()]
+                esperado = linhas[(page - 1) * per_page:page * per_page]
+                dados, _, total_pages = tabela.buscar_por_nome_paginado(nome, page, per_page)
+                assert dados == esperado, ("busca por nome", nome, page, per_page)
+                assert total_pages == -(-len(linhas) // per_page), ("total da busca", nome, page, per_page)
+    tabela.close()
+
+def verificar_separacao_em_blocos(casos=3000, semente=0):
+    """Confere as linhas separadas bloco a bloco contra uma separação linha a linha."""
+    from db import TabelaCSV
+
+    aleatorio = random.Random(semente)
+    tabela = TabelaCSV("blocos", ["a"])
+    for _ in range(casos):
+        # Linhas vazias, \r soltos, linhas maiores que o bloco e arquivo com ou sem \n no fim
+        linhas = [
+            bytes(aleatorio.choice(b"ab,\r") for _ in range(aleatorio.choice([0, 0, 1, 5, 30])))
+            for _ in range(aleatorio.randint(0, 12))
+        ]
+        conteudo = b"a\r\n" + b"\n".join(linhas) + aleatorio.choice([b"", b"\n"])
+        with open(tabela.arquivo_csv, 'wb') as f:
+            f.write(conteudo)
+
+        esperado = []
+        offset = conteudo.find(b"\n") + 1
+        while offset < len(conteudo):
+            fim = conteudo.find(b"\n", offset)
+            fim = len(conteudo) if fim == -1 else fim
+            esperado.append((offset, conteudo[offset:fim]))
+            offset = fim + 1
+
+        tabela.tamanho_bloco = aleatorio.randint(1, 40)
+        assert list(tabela._linhas_brutas()) == esperado, (conteudo, tabela.tamanho_bloco)
+    tabela.close()
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)  # As tabelas gravam o CSV no diretório atual
+        verificar_cache_de_paginas()
+        verificar_separacao_em_blocos()
+    print("Verificações concluídas.")